@@ -4,11 +4,18 @@ Manages shared subscriptions and payment tracking for group members
 """
 
 import os
-import json
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List
+import re
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import asyncio
+from dataclasses import dataclass
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from dotenv import load_dotenv
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
@@ -16,6 +23,7 @@ from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     ContextTypes,
     MessageHandler,
     filters
@@ -31,134 +39,650 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Data storage file
+# Longest /list message in characters; Telegram rejects messages over 4096
+LIST_MESSAGE_LIMIT = 3500
+
+# Whole username-like words (optionally prefixed with @) in a members message;
+# fragments of longer words such as "1abc", "José" or "john.doe" don't match,
+# but trailing punctuation as in "bob." does
+_USERNAME_RE = re.compile(r'(?<![\w@.])@?([A-Za-z][A-Za-z0-9_]{2,31})(?!\w|\.\w)')
+
+# Directory holding one snapshot and write-ahead log per group
+DATA_DIR = 'data'
+# Single-file store used by older versions, split into DATA_DIR on first start
 DATA_FILE = 'subscriptions_data.json'
+# Size in bytes a group's log may reach before its snapshot is rewritten
+COMPACT_BYTES = 1024 * 1024
+# Seconds to wait after a change so a burst of changes is written at once
+FLUSH_DELAY = 0.25
+# Groups kept in memory before the least recently used one is unloaded
+MAX_LOADED_GROUPS = 1024
+# Seconds between a subscription's creation and its next payment
+BILLING_PERIOD = 30 * 24 * 60 * 60
+# Largest accepted subscription cost in cents ($1,000,000.00); keeps every
+# amount far inside the 64-bit integers orjson can encode
+MAX_COST_CENTS = 100_000_000
+# Seconds an admin status lookup is reused before asking Telegram again
+ADMIN_CACHE_TTL = 60
+# Admin status lookups kept before the least recently used one is dropped
+MAX_ADMIN_CACHE = 1024
+
+# Built once at import; /start only fills in the user's name
+WELCOME_TEMPLATE = """
+👋 Welcome {name}!
+
+I help you manage shared subscriptions and split costs with your group.
+
+COMMANDS:
+/add - Create a subscription
+/list - View all subscriptions
+/paid - Mark payment as done
+/delete - Remove a subscription
+
+Add me to your group and use /add to get started! 🚀
+
+💡 I work with usernames - just mention people with @username!
+"""
+
+ADD_USAGE = (
+    "**Usage:** `/add <name> <total_cost>`\n\n"
+    "**Example:** `/add Netflix 15.99`\n\n"
+    "This will create a new subscription that will be split among members."
+)
+
+def split_cost(total_cents: int, member_count: int) -> int:
+    """Split a total cost in cents evenly between members, rounding half up"""
+    share, remainder = divmod(total_cents, member_count)
+    return share + (2 * remainder >= member_count)
+
+def format_cents(cents: int) -> str:
+    """Format an amount in cents as dollars, e.g. 1599 -> '$15.99'"""
+    sign = '-' if cents < 0 else ''
+    dollars, cents = divmod(abs(cents), 100)
+    return f"{sign}${dollars}.{cents:02d}"
+
+def to_timestamp(value) -> Optional[float]:
+    """Convert an ISO date string written by older versions to a Unix timestamp"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return value
+
+def group_file(group_id: str, data_dir: str = DATA_DIR) -> str:
+    """Path of a group's JSON snapshot; its log is the same path + '.wal'"""
+    return os.path.join(data_dir, f"group_{group_id}.json")
+
+@dataclass
+class Subscription:
+    """A shared subscription; payment status is kept in lists aligned with members"""
+    # Slots keep each loaded subscription much smaller than a dict
+    __slots__ = (
+        'id', 'name', 'group_id', 'total_cost_cents', 'cost_per_person_cents',
+        'members', 'paid', 'last_payment', 'created_at', 'next_payment',
+        'next_payment_date'
+    )
+    id: str
+    name: str
+    group_id: str
+    total_cost_cents: int
+    cost_per_person_cents: int
+    # Lowercased usernames
+    members: List[str]
+    paid: List[bool]
+    last_payment: List[Optional[float]]
+    # Unix timestamps
+    created_at: float
+    next_payment: float
+    # Local date of next_payment, as shown by /list
+    next_payment_date: str
 
 class SubscriptionManager:
     """Manages subscription data and operations"""
     
     def __init__(self):
-        self.data = self.load_data()
-    
-    def load_data(self) -> Dict:
-        """Load data from JSON file"""
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                return json.load(f)
-        return {
-            'subscriptions': {},
-            'groups': {},
-            'payments': {}
-        }
-    
-    def save_data(self):
-        """Save data to JSON file"""
-        with open(DATA_FILE, 'w') as f:
-            json.dump(self.data, f, indent=2)
-    
-    def add_subscription(self, group_id: str, name: str, total_cost: float, members: List[str]):
+        # group_id -> {'subscriptions': {sub_id: Subscription}}, least recently used first.
+        # Groups are loaded from disk on first access
+        self._groups: OrderedDict[str, Dict] = OrderedDict()
+        # Secondary indexes over loaded groups: (group_id, member) -> sub_ids
+        # (a dict with None values keeps creation order) and
+        # sub_id -> {username: position in the subscription's member lists}
+        self._by_member: Dict[Tuple[str, str], Dict[str, None]] = {}
+        self._members: Dict[str, Dict[str, int]] = {}
+        # (group_id, lowercased name) -> sub_id of the oldest subscription with that name
+        self._by_name: Dict[Tuple[str, str], str] = {}
+        # sub_id -> number of members marked as paid, kept up to date by _apply
+        self._paid_count: Dict[str, int] = {}
+        # group_id -> /list messages rendered since the group last changed
+        self._rendered_list: Dict[str, List[str]] = {}
+        # A single worker keeps disk reads and writes in the order they were issued
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+        # Per-group log records not yet written and bytes logged since the
+        # last snapshot; set _dirty to schedule a flush
+        self._pending: Dict[str, List[bytes]] = {}
+        self._log_bytes: Dict[str, int] = {}
+        self._dirty = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    def _prepare_data_dir(self):
+        """Create the data directory, migrating the old single-file store into it"""
+        if os.path.isdir(DATA_DIR):
+            return
+        if not os.path.exists(DATA_FILE):
+            os.makedirs(DATA_DIR)
+            return
+        # Migrate into a scratch directory and move it into place only once
+        # complete, so an interrupted migration is redone on the next start
+        tmp_dir = DATA_DIR + '.tmp'
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        self._migrate_single_file(tmp_dir)
+        os.replace(tmp_dir, DATA_DIR)
+        logger.info("Migrated %s into %s/", DATA_FILE, DATA_DIR)
+    
+    def _migrate_single_file(self, data_dir: str):
+        """Split the old single-file store into one snapshot per group"""
+        with open(DATA_FILE, 'rb') as f:
+            data = orjson.loads(f.read())
+        
+        # Older snapshots kept payment state in a separate map keyed by
+        # "<sub_id>_<member>"; fold it into per-member entries, which
+        # _upgrade_sub turns into the current parallel lists on load
+        payments = data.pop('payments', None)
+        if payments is not None:
+            for sub_id, sub in data['subscriptions'].items():
+                members = []
+                for member in sub['members']:
+                    payment = payments.get(f"{sub_id}_{member}", {})
+                    members.append({
+                        'username': member,
+                        'paid': payment.get('paid', False),
+                        'last_payment': payment.get('last_payment')
+                    })
+                sub['members'] = members
+        
+        groups: Dict[str, Dict] = {}
+        for sub_id, sub in data['subscriptions'].items():
+            # Usernames are case-insensitive; store them lowercased
+            for member in sub['members']:
+                member['username'] = member['username'].lower()
+            groups.setdefault(sub['group_id'], {'subscriptions': {}})['subscriptions'][sub_id] = sub
+        for group_id, group in groups.items():
+            self._save_sync(group_id, orjson.dumps(group, option=orjson.OPT_INDENT_2), data_dir)
+        
+        # Route records from the old log to the log of the group they belong to
+        wal_file = DATA_FILE + '.wal'
+        if os.path.exists(wal_file):
+            owner = {sub_id: sub['group_id'] for sub_id, sub in data['subscriptions'].items()}
+            with open(wal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if record['op'] == 'add_sub':
+                        owner[record['p']['id']] = record['p']['sub']['group_id']
+                    group_id = owner.get(record['p']['id'])
+                    if group_id is not None:
+                        self._append_sync({group_id: line}, data_dir)
+    
+    @staticmethod
+    def _read_group(group_id: str) -> Tuple[Dict, List[Dict], int]:
+        """Read a group's snapshot, the log records written after it and the log size"""
+        path = group_file(group_id)
+        group = {'subscriptions': {}}
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                group = orjson.loads(f.read())
+        
+        records = []
+        log_bytes = 0
+        if os.path.exists(path + '.wal'):
+            with open(path + '.wal', 'rb') as f:
+                data = f.read()
+            lines = data.split(b'\n')
+            # Empty unless a crash mid-write left the last line without its newline
+            tail = lines.pop()
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    logger.warning("Ignoring corrupt record in %s.wal", path)
+            if tail:
+                # Repair the tail now, or the next append would be joined onto it
+                try:
+                    records.append(orjson.loads(tail))
+                except orjson.JSONDecodeError:
+                    logger.warning("Dropping torn record at end of %s.wal", path)
+                    with open(path + '.wal', 'r+b') as f:
+                        f.truncate(len(data) - len(tail))
+                        os.fsync(f.fileno())
+                    data = data[:-len(tail)]
+                else:
+                    with open(path + '.wal', 'ab') as f:
+                        f.write(b'\n')
+                        f.flush()
+                        os.fsync(f.fileno())
+                    data += b'\n'
+            log_bytes = len(data)
+        return group, records, log_bytes
+    
+    def _get_group(self, group_id: str) -> Dict:
+        """Return a group's data, loading it from disk on first access"""
+        group = self._groups.get(group_id)
+        if group is not None:
+            self._groups.move_to_end(group_id)
+            return group
+        
+        # Handlers normally load the group first with load_group(); this only
+        # blocks if it was unloaded again in between.
+        # Reading on the storage worker orders the read after queued writes
+        return self._install_group(group_id, self._io.submit(self._read_group, group_id).result())
+    
+    async def load_group(self, group_id: str):
+        """Load a group from disk without blocking the event loop"""
+        group_id = str(group_id)
+        if group_id in self._groups:
+            self._groups.move_to_end(group_id)
+            return
+        read = await asyncio.get_running_loop().run_in_executor(
+            self._io, self._read_group, group_id
+        )
+        # Another handler may have loaded (and changed) the group meanwhile
+        if group_id not in self._groups:
+            self._install_group(group_id, read)
+    
+    def _install_group(self, group_id: str, read: Tuple[Dict, List[Dict], int]) -> Dict:
+        """Index a group read by _read_group and replay its log"""
+        group, records, log_bytes = read
+        self._groups[group_id] = group
+        subscriptions = group['subscriptions']
+        for sub_id, sub in subscriptions.items():
+            sub = subscriptions[sub_id] = self._load_sub(sub_id, sub)
+            self._index_add(group_id, sub_id, sub)
+        # 'seq' is the last log record the snapshot includes; a crash between
+        # writing a snapshot and truncating its log leaves those records behind
+        group.setdefault('seq', 0)
+        # Records from before sequence numbers were added count by position.
+        # A write retried after a failure can land after newer records or
+        # repeat ones already logged, so replay in sequence order
+        numbered = sorted(
+            ((record.get('s', position), record) for position, record in enumerate(records, 1)),
+            key=lambda item: item[0]
+        )
+        for record_seq, record in numbered:
+            if record_seq <= group['seq']:
+                continue
+            self._apply(group_id, record['op'], record['p'])
+            group['seq'] = record_seq
+        self._log_bytes[group_id] = log_bytes
+        
+        while len(self._groups) > MAX_LOADED_GROUPS and self._unload_oldest():
+            pass
+        return group
+    
+    def _unload_oldest(self) -> bool:
+        """Drop the least recently used group whose changes are all written"""
+        # Groups with queued records stay loaded until a flush writes them;
+        # the group just loaded (the last one) is never dropped
+        for group_id in islice(self._groups, len(self._groups) - 1):
+            if group_id not in self._pending:
+                break
+        else:
+            return False
+        group = self._groups.pop(group_id)
+        self._log_bytes.pop(group_id, None)
+        self._rendered_list.pop(group_id, None)
+        for sub_id, sub in group['subscriptions'].items():
+            self._index_remove(group_id, sub_id, sub)
+        return True
+    
+    @staticmethod
+    def _append_sync(batch: Dict[str, bytes], data_dir: str = DATA_DIR):
+        """Append serialized log records to each group's log and sync them to disk"""
+        for group_id, lines in batch.items():
+            with open(group_file(group_id, data_dir) + '.wal', 'ab') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+    
+    @staticmethod
+    def _save_sync(group_id: str, snapshot: bytes, data_dir: str = DATA_DIR):
+        """Atomically write a group's snapshot and truncate the log it covers"""
+        path = group_file(group_id, data_dir)
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(snapshot)
+            # The log is truncated next, so the snapshot must be on disk first
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+        # Make the rename durable before truncating the log it covers
+        if os.name == 'posix':
+            dir_fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        open(path + '.wal', 'w').close()
+    
+    async def compact(self, group_id: str):
+        """Fold a group's log into its snapshot without blocking the event loop"""
+        # Serialize on the loop so the worker never sees data mid-mutation
+        snapshot = orjson.dumps(self._groups[group_id], option=orjson.OPT_INDENT_2)
+        # Queued records are part of the snapshot; they stay queued until it is
+        # written, so a failed write loses nothing
+        queued = len(self._pending.get(group_id, ()))
+        covered = self._log_bytes[group_id]
+        await asyncio.get_running_loop().run_in_executor(
+            self._io, self._save_sync, group_id, snapshot
+        )
+        self._drop_queued(group_id, queued)
+        if group_id in self._log_bytes:
+            self._log_bytes[group_id] -= covered
+    
+    async def flush(self):
+        """Write buffered log records in one pass, compacting groups when due"""
+        if self._pending:
+            # Records stay queued until written, so a failed write is retried
+            # and a group with unwritten records is never unloaded
+            written = {group_id: len(lines) for group_id, lines in self._pending.items()}
+            batch = {group_id: b''.join(lines) for group_id, lines in self._pending.items()}
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._io, self._append_sync, batch)
+            except Exception:
+                # Records that did reach the log are skipped on replay by their sequence number
+                self._dirty.set()
+                raise
+            for group_id, count in written.items():
+                self._drop_queued(group_id, count)
+        for group_id, log_bytes in list(self._log_bytes.items()):
+            if log_bytes >= COMPACT_BYTES and group_id in self._groups:
+                await self.compact(group_id)
+    
+    def _drop_queued(self, group_id: str, count: int):
+        """Forget a group's oldest queued records once they are on disk"""
+        lines = self._pending.get(group_id)
+        if lines is not None:
+            del lines[:count]
+            if not lines:
+                del self._pending[group_id]
+    
+    async def _flusher(self):
+        """Coalesce changes made within FLUSH_DELAY into a single write"""
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(FLUSH_DELAY)
+            self._dirty.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write subscription changes")
+    
+    async def start(self, application: Application):
+        """Prepare storage and start the background flush task (Application post_init hook)"""
+        await asyncio.get_running_loop().run_in_executor(self._io, self._prepare_data_dir)
+        self._flush_task = asyncio.create_task(self._flusher())
+    
+    async def stop(self, application: Application):
+        """Stop the flush task and write final snapshots (post_shutdown hook)"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        for group_id, log_bytes in list(self._log_bytes.items()):
+            if log_bytes:
+                try:
+                    await self.compact(group_id)
+                except Exception:
+                    # Its records stay queued for close() to write
+                    logger.exception("Failed to write snapshot for group %s", group_id)
+    
+    def close(self):
+        """Write snapshots for groups with unsaved changes and stop the storage worker"""
+        self._io.shutdown(wait=True)
+        # Log anything still queued first, so it survives a failed snapshot write
+        if self._pending:
+            self._append_sync({group_id: b''.join(lines) for group_id, lines in self._pending.items()})
+            self._pending = {}
+        for group_id, log_bytes in self._log_bytes.items():
+            if log_bytes:
+                self._save_sync(group_id, orjson.dumps(self._groups[group_id], option=orjson.OPT_INDENT_2))
+    
+    def _log(self, group_id: str, op: str, payload: Dict):
+        """Apply a change to the in-memory data and queue it for the group's log"""
+        group = self._groups[group_id]
+        seq = group['seq'] + 1
+        # Encode first, so a change that can't be logged leaves memory untouched
+        line = orjson.dumps({'op': op, 'p': payload, 's': seq}) + b'\n'
+        self._apply(group_id, op, payload)
+        group['seq'] = seq
+        self._rendered_list.pop(group_id, None)
+        self._log_bytes[group_id] += len(line)
+        self._pending.setdefault(group_id, []).append(line)
+        self._dirty.set()
+    
+    def _apply(self, group_id: str, op: str, p: Dict):
+        """Apply a single logged change to a loaded group and the indexes"""
+        subscriptions = self._groups[group_id]['subscriptions']
+        if op == 'add_sub':
+            # Records replayed from disk hold the subscription as a dict
+            sub = p['sub']
+            if not isinstance(sub, Subscription):
+                sub = self._load_sub(p['id'], sub)
+            subscriptions[p['id']] = sub
+            self._index_add(group_id, p['id'], sub)
+        elif op == 'pay':
+            sub = subscriptions[p['id']]
+            i = self._members[p['id']][p['member']]
+            if sub.paid[i] != p['paid']:
+                self._paid_count[p['id']] += 1 if p['paid'] else -1
+            sub.paid[i] = p['paid']
+            if p['last_payment']:
+                sub.last_payment[i] = to_timestamp(p['last_payment'])
+        elif op == 'del_sub':
+            sub = subscriptions.pop(p['id'])
+            self._index_remove(group_id, p['id'], sub)
+        else:
+            raise ValueError(f"Unknown log operation: {op}")
+    
+    @staticmethod
+    def _upgrade_sub(sub: Dict):
+        """Bring a subscription written by an older version up to date"""
+        # Costs used to be stored as float dollars
+        if 'total_cost' in sub:
+            sub['total_cost_cents'] = int(round(sub.pop('total_cost') * 100))
+            sub['cost_per_person_cents'] = int(round(sub.pop('cost_per_person') * 100))
+        # Members used to be {'username', 'paid', 'last_payment'} entries
+        if 'paid' not in sub:
+            entries = sub['members']
+            sub['members'] = [entry['username'].lower() for entry in entries]
+            sub['paid'] = [entry['paid'] for entry in entries]
+            sub['last_payment'] = [entry['last_payment'] for entry in entries]
+        if 'next_payment_date' not in sub:
+            sub['next_payment_date'] = sub['next_payment'][:10]
+        # Times used to be ISO strings
+        if isinstance(sub['created_at'], str):
+            sub['created_at'] = to_timestamp(sub['created_at'])
+            sub['next_payment'] = to_timestamp(sub['next_payment'])
+            sub['last_payment'] = [to_timestamp(t) for t in sub['last_payment']]
+    
+    @classmethod
+    def _load_sub(cls, sub_id: str, sub: Dict) -> Subscription:
+        """Build a Subscription from its stored form"""
+        cls._upgrade_sub(sub)
+        sub['id'] = sub_id
+        return Subscription(**sub)
+    
+    def _index_add(self, group_id: str, sub_id: str, sub: Subscription):
+        """Register a subscription in the secondary indexes"""
+        for member in sub.members:
+            self._by_member.setdefault((group_id, member), {})[sub_id] = None
+        self._members[sub_id] = {member: i for i, member in enumerate(sub.members)}
+        self._paid_count[sub_id] = sum(sub.paid)
+        self._by_name.setdefault((group_id, sub.name.lower()), sub_id)
+    
+    def _index_remove(self, group_id: str, sub_id: str, sub: Subscription):
+        """Drop a subscription from the secondary indexes"""
+        for member in sub.members:
+            key = (group_id, member)
+            self._by_member[key].pop(sub_id, None)
+            if not self._by_member[key]:
+                del self._by_member[key]
+        del self._members[sub_id]
+        del self._paid_count[sub_id]
+        key = (group_id, sub.name.lower())
+        if self._by_name.get(key) == sub_id:
+            del self._by_name[key]
+            # Names aren't unique; hand the name to the next oldest subscription
+            # (unless the whole group is being unloaded)
+            group = self._groups.get(group_id)
+            for other_id, other in group['subscriptions'].items() if group else ():
+                if other.name.lower() == key[1]:
+                    self._by_name[key] = other_id
+                    break
+    
+    def loaded_subscriptions(self) -> List[Subscription]:
+        """Get subscriptions of every group currently held in memory"""
+        return [
+            sub
+            for group in self._groups.values()
+            for sub in group['subscriptions'].values()
+        ]
+    
+    def add_subscription(self, group_id: str, name: str, total_cost_cents: int, members: List[str]):
         """Add a new subscription"""
         # Ensure group_id is string
         group_id = str(group_id)
-        sub_id = f"{group_id}_{name}_{datetime.now().timestamp()}"
-        cost_per_person = total_cost / len(members)
-        
-        self.data['subscriptions'][sub_id] = {
-            'name': name,
-            'group_id': group_id,
-            'total_cost': total_cost,
-            'members': members,
-            'cost_per_person': round(cost_per_person, 2),
-            'created_at': datetime.now().isoformat(),
-            'next_payment': (datetime.now() + timedelta(days=30)).isoformat()
-        }
-        
-        # Initialize payment status for each member
-        for member in members:
-            payment_key = f"{sub_id}_{member}"
-            self.data['payments'][payment_key] = {
-                'paid': False,
-                'last_payment': None
-            }
+        self._get_group(group_id)
+        now = time.time()
+        next_payment = now + BILLING_PERIOD
+        # '|' can't appear in a group id, so the parts of the id stay unambiguous
+        sub_id = f"{group_id}|{name}|{now}"
+        sub = Subscription(
+            id=sub_id,
+            name=name,
+            group_id=group_id,
+            total_cost_cents=total_cost_cents,
+            cost_per_person_cents=split_cost(total_cost_cents, len(members)),
+            members=[member.lower() for member in members],
+            paid=[False] * len(members),
+            last_payment=[None] * len(members),
+            created_at=now,
+            next_payment=next_payment,
+            next_payment_date=time.strftime('%Y-%m-%d', time.localtime(next_payment))
+        )
         
-        self.save_data()
+        self._log(group_id, 'add_sub', {'id': sub_id, 'sub': sub})
         return sub_id
     
-    def get_subscriptions(self, group_id: str) -> List[Dict]:
+    def get_subscriptions(self, group_id: str) -> List[Subscription]:
         """Get all subscriptions for a group"""
-        return [
-            {**sub, 'id': sub_id}
-            for sub_id, sub in self.data['subscriptions'].items()
-            if sub['group_id'] == str(group_id)
-        ]
+        return list(self._get_group(str(group_id))['subscriptions'].values())
+    
+    def find_subscription(self, group_id: str, name: str) -> Optional[Subscription]:
+        """Find a group's subscription by name, ignoring case"""
+        group_id = str(group_id)
+        subscriptions = self._get_group(group_id)['subscriptions']
+        sub_id = self._by_name.get((group_id, name.lower()))
+        return subscriptions[sub_id] if sub_id is not None else None
+    
+    def get_paid_count(self, sub_id: str) -> int:
+        """Get the number of members of a loaded subscription marked as paid"""
+        return self._paid_count[sub_id]
+    
+    def get_rendered_list(self, group_id: str) -> Optional[List[str]]:
+        """Get the cached /list messages for a group, if it hasn't changed since"""
+        return self._rendered_list.get(str(group_id))
+    
+    def set_rendered_list(self, group_id: str, messages: List[str]):
+        """Cache a group's /list messages until its next change"""
+        group_id = str(group_id)
+        if group_id in self._groups:
+            self._rendered_list[group_id] = messages
+    
+    def is_member(self, group_id: str, sub_id: str, member_id: str) -> bool:
+        """Check if a (lowercased) username belongs to a subscription"""
+        self._get_group(str(group_id))
+        return member_id in self._members.get(sub_id, ())
     
     def get_member_dues(self, group_id: str, member_id: str) -> List[Dict]:
         """Get payment dues for a specific member"""
+        group_id = str(group_id)
+        member_id = str(member_id).lower()
+        subscriptions = self._get_group(group_id)['subscriptions']
         dues = []
-        for sub_id, sub in self.data['subscriptions'].items():
-            if sub['group_id'] == str(group_id) and str(member_id) in sub['members']:
-                payment_key = f"{sub_id}_{member_id}"
-                payment_status = self.data['payments'].get(payment_key, {})
-                dues.append({
-                    'subscription': sub['name'],
-                    'amount': sub['cost_per_person'],
-                    'paid': payment_status.get('paid', False),
-                    'next_payment': sub['next_payment']
-                })
+        for sub_id in self._by_member.get((group_id, member_id), ()):
+            sub = subscriptions[sub_id]
+            dues.append({
+                'subscription': sub.name,
+                'amount_cents': sub.cost_per_person_cents,
+                'paid': sub.paid[self._members[sub_id][member_id]],
+                'next_payment': sub.next_payment
+            })
         return dues
     
-    def mark_payment(self, sub_id: str, member_id: str, paid: bool = True):
+    def mark_payment(self, group_id: str, sub_id: str, member_id: str, paid: bool = True):
         """Mark payment status for a member"""
-        payment_key = f"{sub_id}_{member_id}"
-        if payment_key in self.data['payments']:
-            self.data['payments'][payment_key]['paid'] = paid
-            if paid:
-                self.data['payments'][payment_key]['last_payment'] = datetime.now().isoformat()
-            self.save_data()
+        group_id = str(group_id)
+        sub = self._get_group(group_id)['subscriptions'].get(sub_id)
+        position = self._members[sub_id].get(member_id) if sub else None
+        if position is None:
+            return False
+        # Re-sending /paid is common; don't log a change that changes nothing
+        if sub.paid[position] == paid:
             return True
-        return False
+        self._log(group_id, 'pay', {
+            'id': sub_id,
+            'member': member_id,
+            'paid': paid,
+            'last_payment': time.time() if paid else None
+        })
+        return True
     
-    def delete_subscription(self, sub_id: str, group_id: str) -> bool:
+    def delete_subscription(self, group_id: str, sub_id: str) -> bool:
         """Delete a subscription"""
-        if sub_id in self.data['subscriptions']:
-            sub = self.data['subscriptions'][sub_id]
-            if sub['group_id'] == str(group_id):
-                # Delete associated payments
-                for member_id in sub['members']:
-                    payment_key = f"{sub_id}_{member_id}"
-                    if payment_key in self.data['payments']:
-                        del self.data['payments'][payment_key]
-                
-                # Delete subscription
-                del self.data['subscriptions'][sub_id]
-                self.save_data()
-                return True
+        group_id = str(group_id)
+        if sub_id in self._get_group(group_id)['subscriptions']:
+            self._log(group_id, 'del_sub', {'id': sub_id})
+            return True
         return False
 
 # Initialize manager
 manager = SubscriptionManager()
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /start command - Welcome message"""
-    user = update.effective_user
-    
-    welcome_text = f"""
-👋 Welcome {user.first_name}!
+# (chat_id, user_id) -> (member status, expires_at), least recently used first
+_admin_cache = OrderedDict()
 
-I help you manage shared subscriptions and split costs with your group.
-
-COMMANDS:
-/add - Create a subscription
-/list - View all subscriptions
-/paid - Mark payment as done
-/delete - Remove a subscription
+async def is_admin(chat, user_id: int) -> bool:
+    """Check if a user is a chat admin, caching the answer for a short while"""
+    key = (chat.id, user_id)
+    now = time.monotonic()
+    cached = _admin_cache.get(key)
+    if cached and cached[1] > now:
+        _admin_cache.move_to_end(key)
+        status = cached[0]
+    else:
+        member = await chat.get_member(user_id)
+        status = member.status
+        _admin_cache[key] = (status, now + ADMIN_CACHE_TTL)
+        _admin_cache.move_to_end(key)
+        if len(_admin_cache) > MAX_ADMIN_CACHE:
+            _admin_cache.popitem(last=False)
+    return status in ['creator', 'administrator']
 
-Add me to your group and use /add to get started! 🚀
+async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle chat member updates - Forget cached admin status on role changes"""
+    change = update.chat_member
+    _admin_cache.pop((change.chat.id, change.new_chat_member.user.id), None)
 
-💡 I work with usernames - just mention people with @username!
-"""
-    
-    await update.message.reply_text(welcome_text)
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /start command - Welcome message"""
+    user = update.effective_user
+    await update.message.reply_text(WELCOME_TEMPLATE.format(name=user.first_name))
 
 async def debug_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /debug command - Show debug info (admin only)"""
@@ -167,28 +691,29 @@ async def debug_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Check if user is admin
     try:
-        member = await chat.get_member(user.id)
-        if member.status not in ['creator', 'administrator']:
+        if not await is_admin(chat, user.id):
             return
     except Exception:
         return
     
-    debug_text = f"DEBUG INFO:\n\n"
-    debug_text += f"Chat ID: {chat.id}\n"
-    debug_text += f"Chat Type: {chat.type}\n\n"
+    parts = [
+        "DEBUG INFO:\n\n",
+        f"Chat ID: {chat.id}\n",
+        f"Chat Type: {chat.type}\n\n",
+    ]
     
     # Show stored subscriptions
-    debug_text += f"STORED SUBSCRIPTIONS:\n"
-    all_subs = manager.data.get('subscriptions', {})
+    parts.append("LOADED SUBSCRIPTIONS:\n")
+    all_subs = manager.loaded_subscriptions()
     if all_subs:
-        for sub_id, sub in all_subs.items():
-            debug_text += f"• {sub['name']} (Group: {sub['group_id']})\n"
+        for sub in all_subs:
+            parts.append(f"• {sub.name} (Group: {sub.group_id})\n")
     else:
-        debug_text += "None\n"
+        parts.append("None\n")
     
-    debug_text += f"\nTotal subscriptions in DB: {len(all_subs)}"
+    parts.append(f"\nTotal subscriptions loaded: {len(all_subs)}")
     
-    await update.message.reply_text(debug_text)
+    await update.message.reply_text("".join(parts))
 
 async def add_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /add command - Create subscription"""
@@ -205,99 +730,124 @@ async def add_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Parse arguments
     if len(context.args) < 2:
-        await update.message.reply_text(
-            "**Usage:** `/add <name> <total_cost>`\n\n"
-            "**Example:** `/add Netflix 15.99`\n\n"
-            "This will create a new subscription that will be split among members.",
-            
-        )
+        await update.message.reply_text(ADD_USAGE)
         return
     
     name = context.args[0]
     try:
-        total_cost = float(context.args[1])
-    except ValueError:
+        total_cost_cents = int(round(float(context.args[1]) * 100))
+    except (ValueError, OverflowError):
         await update.message.reply_text("❌ Invalid cost. Please enter a number.")
         return
+    if not 0 < total_cost_cents <= MAX_COST_CENTS:
+        await update.message.reply_text(
+            f"❌ Invalid cost. Please enter an amount between $0.01 and {format_cents(MAX_COST_CENTS)}."
+        )
+        return
+    
+    # Store context for next message before awaiting, so a members message
+    # sent right away isn't handled before it exists
+    context.user_data['pending_subscription'] = {
+        'name': name,
+        'cost_cents': total_cost_cents,
+        'group_id': chat.id,
+        'creator_id': user.id,
+        'creator_username': user.username or user.first_name
+    }
     
     await update.message.reply_text(
         f"📝 **Creating subscription:** {name}\n"
-        f"💰 **Total Cost:** ${total_cost}\n\n"
+        f"💰 **Total Cost:** {format_cents(total_cost_cents)}\n\n"
         f"Now mention the members (including yourself if needed).\n\n"
         f"**Example:** @john @alice @bob\n\n"
         f"💡 You can also just type usernames: john alice bob",
         
     )
-    
-    # Store context for next message
-    context.user_data['pending_subscription'] = {
-        'name': name,
-        'cost': total_cost,
-        'group_id': chat.id,
-        'creator_id': user.id,
-        'creator_username': user.username or user.first_name
-    }
 
-async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /list command - View all subscriptions with payment status"""
-    chat = update.effective_chat
-    
-    if chat.type == 'private':
-        await update.message.reply_text(
-            "ℹ️ Please use this command in your group."
-        )
-        return
-    
-    logger.info(f"List command called for group {chat.id}")
-    subscriptions = manager.get_subscriptions(chat.id)
-    logger.info(f"Found {len(subscriptions)} subscriptions")
+def render_list(subscriptions: List[Subscription]) -> List[str]:
+    """Render /list as one or more messages"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Found %d subscriptions", len(subscriptions))
     
     if not subscriptions:
-        await update.message.reply_text(
-            "📭 No subscriptions yet.\n\nCreate one with: /add Netflix 15.99"
-        )
-        return
+        return ["📭 No subscriptions yet.\n\nCreate one with: /add Netflix 15.99"]
     
     # Build subscription list with details (plain text, no markdown)
-    list_text = "📋 SUBSCRIPTIONS\n\n"
+    messages = []
+    parts = ["📋 SUBSCRIPTIONS\n\n"]
+    length = len(parts[0])
+    # Index in parts where the current message's first subscription starts
+    message_start = len(parts)
     
-    total_cost = 0
+    total_cents = 0
     for i, sub in enumerate(subscriptions, 1):
-        total_cost += sub['total_cost']
+        total_cents += sub.total_cost_cents
+        block_start = len(parts)
         
-        # Count paid members
-        paid_count = 0
-        pending_members = []
-        for member_id in sub['members']:
-            payment_key = f"{sub['id']}_{member_id}"
-            payment = manager.data['payments'].get(payment_key, {})
-            if payment.get('paid'):
-                paid_count += 1
-            else:
-                pending_members.append(member_id)
+        paid_count = manager.get_paid_count(sub.id)
+        member_count = len(sub.members)
         
-        list_text += f"{i}. {sub['name']}\n"
-        list_text += f"   💰 ${sub['cost_per_person']}/person (${sub['total_cost']} total)\n"
-        list_text += f"   👥 {len(sub['members'])} members | "
+        parts.append(f"{i}. {sub.name}\n")
+        parts.append(
+            f"   💰 {format_cents(sub.cost_per_person_cents)}/person "
+            f"({format_cents(sub.total_cost_cents)} total)\n"
+        )
+        parts.append(f"   👥 {member_count} members | ")
         
-        if paid_count == len(sub['members']):
-            list_text += "✅ All paid\n"
+        if paid_count == member_count:
+            parts.append("✅ All paid\n")
         else:
-            list_text += f"⏳ {paid_count}/{len(sub['members'])} paid\n"
-            if pending_members:
-                # Format usernames with @
-                pending_display = ', '.join(['@'+m for m in pending_members[:3]])
-                list_text += f"   Pending: {pending_display}"
-                if len(pending_members) > 3:
-                    list_text += f" +{len(pending_members)-3} more"
-                list_text += "\n"
+            parts.append(f"⏳ {paid_count}/{member_count} paid\n")
+            # Only the first three pending members are shown, so stop scanning there
+            pending_count = member_count - paid_count
+            pending_members = islice(
+                (m for m, paid in zip(sub.members, sub.paid) if not paid), 3
+            )
+            # Format usernames with @
+            pending_display = ', '.join(['@'+m for m in pending_members])
+            parts.append(f"   Pending: {pending_display}")
+            if pending_count > 3:
+                parts.append(f" +{pending_count-3} more")
+            parts.append("\n")
         
-        list_text += f"   📅 Next: {sub['next_payment'][:10]}\n\n"
+        parts.append(f"   📅 Next: {sub.next_payment_date}\n\n")
+        
+        # Split at subscription boundaries once a message would grow past the
+        # limit; the TOTAL line goes in the last one
+        block_length = sum(len(part) for part in parts[block_start:])
+        # Never send a message holding no subscription (just the header)
+        if length + block_length > LIST_MESSAGE_LIMIT and block_start > message_start:
+            messages.append("".join(parts[:block_start]))
+            parts = parts[block_start:]
+            message_start = 0
+            length = 0
+        length += block_length
+    
+    parts.append(f"💳 TOTAL: {format_cents(total_cents)}/month")
+    messages.append("".join(parts))
+    return messages
+
+async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /list command - View all subscriptions with payment status"""
+    chat = update.effective_chat
+    
+    if chat.type == 'private':
+        await update.message.reply_text(
+            "ℹ️ Please use this command in your group."
+        )
+        return
     
-    list_text += f"💳 TOTAL: ${total_cost:.2f}/month"
+    logger.info("List command called for group %s", chat.id)
+    await manager.load_group(chat.id)
+    messages = manager.get_rendered_list(chat.id)
+    if messages is None:
+        messages = render_list(manager.get_subscriptions(chat.id))
+        manager.set_rendered_list(chat.id, messages)
     
-    # Use plain text (no parse_mode) to avoid markdown issues with underscores
-    await update.message.reply_text(list_text)
+    # Use plain text (no parse_mode) to avoid markdown issues with underscores.
+    # Messages are sent one after another so they arrive in order
+    for text in messages:
+        await update.message.reply_text(text)
 
 async def paid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /paid command - Mark as paid"""
@@ -321,14 +871,8 @@ async def paid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     sub_name = context.args[0]
-    subscriptions = manager.get_subscriptions(chat.id)
-    
-    # Find matching subscription
-    matching_sub = None
-    for sub in subscriptions:
-        if sub['name'].lower() == sub_name.lower():
-            matching_sub = sub
-            break
+    await manager.load_group(chat.id)
+    matching_sub = manager.find_subscription(chat.id, sub_name)
     
     if not matching_sub:
         await update.message.reply_text(
@@ -340,39 +884,25 @@ async def paid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Check if user is a member (check by username or user ID fallback)
     user_identifier = user.username if user.username else f"{user.first_name}_{user.id}"
+    # Members are stored lowercased
+    member_key = user_identifier.lower()
     
-    # Check if username matches any member
-    is_member = False
-    member_key = None
-    
-    for member in matching_sub['members']:
-        # Direct match
-        if member.lower() == user_identifier.lower():
-            is_member = True
-            member_key = member
-            break
-        # Also check without @ symbol
-        if member.lower() == user.username.lower() if user.username else False:
-            is_member = True
-            member_key = member
-            break
-    
-    if not is_member:
+    if not manager.is_member(chat.id, matching_sub.id, member_key):
         await update.message.reply_text(
-            f"⚠️ You're not a member of the {matching_sub['name']} subscription.\n\n"
+            f"⚠️ You're not a member of the {matching_sub.name} subscription.\n\n"
             f"Your username: @{user_identifier}\n"
-            f"Members: {', '.join(['@'+m for m in matching_sub['members']])}"
+            f"Members: {', '.join(['@'+m for m in matching_sub.members])}"
         )
         return
     
     # Mark as paid using the member key
-    success = manager.mark_payment(matching_sub['id'], member_key, True)
+    success = manager.mark_payment(chat.id, matching_sub.id, member_key, True)
     
     if success:
         await update.message.reply_text(
             f"✅ PAYMENT CONFIRMED!\n\n"
             f"Thank you {user.first_name}!\n"
-            f"Your payment for {matching_sub['name']} (${matching_sub['cost_per_person']}) "
+            f"Your payment for {matching_sub.name} ({format_cents(matching_sub.cost_per_person_cents)}) "
             f"has been marked as paid.\n\n"
             f"Use /list to see updated status."
         )
@@ -392,14 +922,13 @@ async def delete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Check if user is admin
     try:
-        member = await chat.get_member(user.id)
-        if member.status not in ['creator', 'administrator']:
+        if not await is_admin(chat, user.id):
             await update.message.reply_text(
                 "⚠️ Only group admins can delete subscriptions."
             )
             return
     except Exception as e:
-        logger.error(f"Error checking admin status: {e}")
+        logger.error("Error checking admin status: %s", e)
     
     # Check if subscription name provided
     if len(context.args) < 1:
@@ -412,14 +941,8 @@ async def delete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     sub_name = context.args[0]
-    subscriptions = manager.get_subscriptions(chat.id)
-    
-    # Find matching subscription
-    matching_sub = None
-    for sub in subscriptions:
-        if sub['name'].lower() == sub_name.lower():
-            matching_sub = sub
-            break
+    await manager.load_group(chat.id)
+    matching_sub = manager.find_subscription(chat.id, sub_name)
     
     if not matching_sub:
         await update.message.reply_text(
@@ -429,12 +952,12 @@ async def delete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Delete subscription
-    success = manager.delete_subscription(matching_sub['id'], chat.id)
+    success = manager.delete_subscription(chat.id, matching_sub.id)
     
     if success:
         await update.message.reply_text(
             f"🗑️ SUBSCRIPTION DELETED\n\n"
-            f"The {matching_sub['name']} subscription has been removed.\n"
+            f"The {matching_sub.name} subscription has been removed.\n"
             f"All payment records have been cleared.\n\n"
             f"Use /list to see remaining subscriptions."
         )
@@ -450,33 +973,32 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = update.message
         
         # Extract usernames from mentions (entities)
-        member_usernames = []
+        candidates = []
         
-        # Check if message has entities (mentions)
-        if message.entities:
-            for entity in message.entities:
-                if entity.type == "mention":
-                    # Extract username from @username
-                    username = text[entity.offset:entity.offset + entity.length]
-                    username = username.replace('@', '')  # Remove @
-                    member_usernames.append(username)
-                elif entity.type == "text_mention":
-                    # User mentioned but doesn't have username, use their name
-                    if entity.user.username:
-                        member_usernames.append(entity.user.username)
-                    else:
-                        # Store user ID as fallback for users without username
-                        member_usernames.append(f"{entity.user.first_name}_{entity.user.id}")
+        # parse_entities converts Telegram's UTF-16 offsets, so mentions
+        # after emoji are cut correctly
+        for entity, entity_text in message.parse_entities(["mention", "text_mention"]).items():
+            if entity.type == "mention":
+                # Extract username from @username
+                candidates.append(entity_text[1:])
+            elif entity.user.username:
+                # Mention by name (text_mention) of a user who has a username
+                candidates.append(entity.user.username)
+            else:
+                # Store user ID as fallback for users without username
+                candidates.append(f"{entity.user.first_name}_{entity.user.id}")
         
         # Also parse text for usernames (without @)
-        words = text.split()
-        for word in words:
-            clean_word = word.replace('@', '').strip()
-            # If it looks like a username (alphanumeric with underscores)
-            if clean_word and not clean_word.isdigit() and clean_word not in member_usernames:
-                # Simple validation: contains letters
-                if any(c.isalpha() for c in clean_word):
-                    member_usernames.append(clean_word)
+        candidates.extend(m.group(1) for m in _USERNAME_RE.finditer(text))
+        
+        # Remove duplicates (usernames are case-insensitive) while preserving order
+        member_usernames = []
+        seen = set()
+        for username in candidates:
+            key = username.lower()
+            if key not in seen:
+                seen.add(key)
+                member_usernames.append(username)
         
         if not member_usernames:
             await update.message.reply_text(
@@ -488,20 +1010,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
         
-        # Remove duplicates while preserving order
-        member_usernames = list(dict.fromkeys(member_usernames))
+        # Clear pending data before awaiting, so a second message sent meanwhile
+        # can't create the subscription again
+        del context.user_data['pending_subscription']
         
         # Create subscription
+        await manager.load_group(pending['group_id'])
         sub_id = manager.add_subscription(
             group_id=pending['group_id'],
             name=pending['name'],
-            total_cost=pending['cost'],
+            total_cost_cents=pending['cost_cents'],
             members=member_usernames
         )
         
-        logger.info(f"Created subscription {sub_id} for group {pending['group_id']} with members: {member_usernames}")
+        logger.info(
+            "Created subscription %s for group %s with members: %s",
+            sub_id, pending['group_id'], member_usernames
+        )
         
-        cost_per_person = pending['cost'] / len(member_usernames)
+        cost_per_person_cents = split_cost(pending['cost_cents'], len(member_usernames))
         
         # Build member list for display
         member_display = ', '.join([f"@{m}" for m in member_usernames])
@@ -509,15 +1036,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             f"✅ SUBSCRIPTION CREATED!\n\n"
             f"{pending['name']}\n"
-            f"💰 Total: ${pending['cost']}\n"
+            f"💰 Total: {format_cents(pending['cost_cents'])}\n"
             f"👥 Members ({len(member_usernames)}): {member_display}\n"
-            f"💵 Per person: ${cost_per_person:.2f}\n"
+            f"💵 Per person: {format_cents(cost_per_person_cents)}\n"
             f"📅 Next payment: 30 days\n\n"
             f"Members can mark payments: /paid {pending['name']}"
         )
-        
-        # Clear pending data
-        del context.user_data['pending_subscription']
 
 def main():
     """Start the bot"""
@@ -534,7 +1058,17 @@ def main():
         return
     
     # Create application
-    application = Application.builder().token(TOKEN).build()
+    # The manager's flush task runs for the lifetime of the application.
+    # Updates are handled concurrently; manager calls never await, so a
+    # handler's check-then-change can't interleave with another's
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(True)
+        .post_init(manager.start)
+        .post_shutdown(manager.stop)
+        .build()
+    )
     
     # Add command handlers
     application.add_handler(CommandHandler("start", start))
@@ -544,6 +1078,11 @@ def main():
     application.add_handler(CommandHandler("paid", paid_command))
     application.add_handler(CommandHandler("delete", delete_command))
     
+    # Keep cached admin checks in sync with role changes. Telegram only sends
+    # these updates to bots that are admins; elsewhere a change applies once
+    # the cached status expires (ADMIN_CACHE_TTL)
+    application.add_handler(ChatMemberHandler(track_chat_member, ChatMemberHandler.CHAT_MEMBER))
+    
     # Add message handler for regular messages
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
@@ -559,6 +1098,9 @@ def main():
     print("\n💡 Now using usernames instead of IDs!")
     print("\nPress Ctrl+C to stop")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
+    
+    # run_polling returns on Ctrl+C / SIGTERM; persist anything left unwritten
+    manager.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file